@@ -1,14 +1,19 @@
 # backend/bio_server.py
 from http.server import BaseHTTPRequestHandler, HTTPServer
-import json, os, datetime
+from urllib.parse import urlparse, parse_qs
+import json, datetime
 from bio_nano_terminal import calcular_totales, WASTE_PROFILES, BIOAI_LEVELS
 from utils_visual import generar_estadisticas_visuales
+from historial_store import (
+    inicializar as inicializar_historial,
+    guardar_historial,
+    consultar_historial,
+    rango_consulta,
+    iniciar_compactacion_periodica,
+)
 
-DATA_PATH = os.path.join(os.path.dirname(__file__), "data", "historial.json")
-os.makedirs(os.path.dirname(DATA_PATH), exist_ok=True)
-if not os.path.exists(DATA_PATH):
-    with open(DATA_PATH, "w", encoding="utf-8") as f:
-        json.dump([], f, ensure_ascii=False, indent=2)
+# Historial particionado en data/historial/ (ver historial_store.py)
+inicializar_historial()
 
 def adaptar_a_frontend(summary):
     """
@@ -47,16 +52,6 @@ def adaptar_a_frontend(summary):
     }
     return adaptado
 
-def guardar_historial(entry):
-    try:
-        with open(DATA_PATH, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    except Exception:
-        data = []
-    data.append(entry)
-    with open(DATA_PATH, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-
 class BioHandler(BaseHTTPRequestHandler):
     def _set_headers_json(self, code=200):
         self.send_response(code)
@@ -124,10 +119,21 @@ class BioHandler(BaseHTTPRequestHandler):
                 print("❌ Error en /api/calcular:", e)
 
     def do_GET(self):
-        if self.path == "/api/historial":
+        url = urlparse(self.path)
+        if url.path == "/api/historial":
+            # Rango opcional ?desde=AAAA-MM-DD&hasta=AAAA-MM-DD: solo se leen esos segmentos
+            params = parse_qs(url.query)
+            try:
+                desde, hasta = rango_consulta(
+                    params.get("desde", [None])[0],
+                    params.get("hasta", [None])[0],
+                )
+            except ValueError:
+                self._set_headers_json(400)
+                self.wfile.write(json.dumps({"error": "Fechas en formato AAAA-MM-DD"}).encode())
+                return
             try:
-                with open(DATA_PATH, "r", encoding="utf-8") as f:
-                    data = json.load(f)
+                data = consultar_historial(desde, hasta)
                 self._set_headers_json(200)
                 self.wfile.write(json.dumps(data).encode())
                 print(f"📜 Historial enviado ({len(data)} registros).")
@@ -145,5 +151,6 @@ class BioHandler(BaseHTTPRequestHandler):
 
 if __name__ == "__main__":
     server = HTTPServer(("localhost", 5500), BioHandler)
+    iniciar_compactacion_periodica()
     print("🌿 Servidor BIOIA activo en: http://localhost:5500")
     server.serve_forever()
@@ -0,0 +1,311 @@
+# backend/historial_store.py
+# Historial particionado por tiempo: un segmento JSON Lines por día (o por mes),
+# con retención configurable y compactación en segundo plano.
+#
+# Estructura en disco (data/historial/):
+#   2025-10-05.jsonl           segmento diario activo   (HISTORIAL_PARTICION=dia)
+#   2025-10.jsonl              segmento mensual activo  (HISTORIAL_PARTICION=mes)
+#   2025-10.compacto.jsonl     mes ya compactado (sin 'details')
+#   2025-10-05.legado.jsonl    entradas migradas del antiguo historial.json
+#
+# El _lock solo protege hilos de un mismo proceso: este diseño asume un único
+# proceso (uvicorn con un worker). Con varios workers cada uno lanzaría su
+# propio hilo de compactación y competirían por los mismos ficheros.
+import json, os, datetime, threading, calendar, uuid
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+SEGMENTOS_DIR = os.path.join(DATA_DIR, "historial")
+LEGACY_PATH = os.path.join(DATA_DIR, "historial.json")
+
+# Configuración (variables de entorno)
+PARTICION = os.environ.get("HISTORIAL_PARTICION", "dia")                 # "dia" | "mes"
+if PARTICION not in ("dia", "mes"):
+    raise ValueError(f"HISTORIAL_PARTICION debe ser 'dia' o 'mes', no {PARTICION!r}")
+RETENCION_DIAS = int(os.environ.get("HISTORIAL_RETENCION_DIAS", "0"))    # 0 = sin límite
+VENTANA_DIAS = int(os.environ.get("HISTORIAL_VENTANA_DIAS", "30"))       # días devueltos sin 'desde'
+COMPACTAR_TRAS_DIAS = int(os.environ.get("HISTORIAL_COMPACTAR_DIAS", "7"))
+COMPACTAR_CADA_S = int(os.environ.get("HISTORIAL_COMPACTAR_CADA_S", "3600"))
+
+SUFIJO = ".jsonl"
+SUFIJO_COMPACTO = ".compacto.jsonl"
+SUFIJO_LEGADO = ".legado.jsonl"
+FUSIONANDO = ".fusionando"  # segmento apartado durante una compactación en curso
+
+# Fecha fija para entradas sin 'fecha' válida: así no cambian de segmento con el tiempo
+FECHA_DESCONOCIDA = datetime.date(1970, 1, 1)
+
+_lock = threading.Lock()
+
+
+def _fecha_de(entry):
+    """Devuelve la fecha (date) de una entrada a partir de su campo 'fecha'."""
+    try:
+        return datetime.date.fromisoformat(str(entry.get("fecha", ""))[:10])
+    except ValueError:
+        return FECHA_DESCONOCIDA
+
+
+def _clave_segmento(fecha):
+    return fecha.strftime("%Y-%m-%d") if PARTICION == "dia" else fecha.strftime("%Y-%m")
+
+
+def _rango_segmento(nombre):
+    """Rango [inicio, fin] de fechas que cubre un segmento según su nombre."""
+    clave = nombre.split(".", 1)[0]
+    try:
+        if len(clave) == 10:
+            dia = datetime.date.fromisoformat(clave)
+            return dia, dia
+        anio, mes = int(clave[:4]), int(clave[5:7])
+        return datetime.date(anio, mes, 1), datetime.date(anio, mes, calendar.monthrange(anio, mes)[1])
+    except ValueError:
+        return None
+
+
+def _listar_segmentos():
+    """Lista (nombre, inicio, fin) de los segmentos existentes, ordenados por fecha."""
+    if not os.path.isdir(SEGMENTOS_DIR):
+        return []
+    segmentos = []
+    for nombre in os.listdir(SEGMENTOS_DIR):
+        if not nombre.endswith(SUFIJO):
+            continue
+        rango = _rango_segmento(nombre)
+        if rango:
+            segmentos.append((nombre, *rango))
+    return sorted(segmentos, key=lambda s: (s[1], s[2], s[0]))
+
+
+def _leer_segmento(nombre):
+    return _leer_con_cabecera(nombre)[1]
+
+
+def _leer_con_cabecera(nombre):
+    """Devuelve (fusionados, entries); 'fusionados' solo existe en los compactos."""
+    fusionados, entries = [], []
+    with open(os.path.join(SEGMENTOS_DIR, nombre), "r", encoding="utf-8") as f:
+        for linea in f:
+            linea = linea.strip()
+            if linea:
+                try:
+                    entry = json.loads(linea)
+                except ValueError:
+                    continue  # línea truncada por un corte; se ignora
+                if not isinstance(entry, dict):
+                    continue  # JSON válido pero no es una entrada; se ignora
+                if "_fusionados" in entry:
+                    fusionados = entry["_fusionados"]
+                else:
+                    entries.append(entry)
+    return fusionados, entries
+
+
+def _escribir_segmento(nombre, entries, fusionados=None):
+    """Escritura atómica de un segmento completo (solo usada al compactar/migrar)."""
+    destino = os.path.join(SEGMENTOS_DIR, nombre)
+    tmp = destino + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        if fusionados is not None:
+            f.write(json.dumps({"_fusionados": fusionados}, ensure_ascii=False) + "\n")
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    os.replace(tmp, destino)
+
+
+def _compactar_entry(entry):
+    """Quita el desglose 'details' (muy verboso) de los resultados de una entrada."""
+    resultados = entry.get("resultados")
+    if isinstance(resultados, dict) and "details" in resultados:
+        entry = {**entry, "resultados": {k: v for k, v in resultados.items() if k != "details"}}
+    return entry
+
+
+def _migrar_legacy():
+    """
+    Reparte el antiguo historial.json monolítico en segmentos '.legado.jsonl'
+    (una sola vez). Esos segmentos se sobrescriben, no se fusionan: si el proceso
+    muere antes del rename final, repetir la migración no duplica entradas.
+    """
+    if not os.path.exists(LEGACY_PATH) or os.path.exists(LEGACY_PATH + ".migrado"):
+        return
+    try:
+        with open(LEGACY_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception:
+        data = []
+    grupos = {}
+    for entry in data if isinstance(data, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        grupos.setdefault(_clave_segmento(_fecha_de(entry)) + SUFIJO_LEGADO, []).append(entry)
+    for nombre, entries in grupos.items():
+        _escribir_segmento(nombre, entries)
+    os.replace(LEGACY_PATH, LEGACY_PATH + ".migrado")
+
+
+def inicializar():
+    os.makedirs(SEGMENTOS_DIR, exist_ok=True)
+    with _lock:
+        _migrar_legacy()
+
+
+def guardar_historial(entry):
+    """Añade la entrada al final de su segmento (append, sin reescribir el historial)."""
+    nombre = _clave_segmento(_fecha_de(entry)) + SUFIJO
+    with _lock:
+        with open(os.path.join(SEGMENTOS_DIR, nombre), "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def rango_consulta(desde=None, hasta=None):
+    """
+    Convierte los parámetros 'desde'/'hasta' (texto AAAA-MM-DD) en fechas (o None).
+    Lanza ValueError si alguna fecha no es válida.
+    """
+    desde_d = datetime.date.fromisoformat(desde) if desde else None
+    hasta_d = datetime.date.fromisoformat(hasta) if hasta else None
+    return desde_d, hasta_d
+
+
+def consultar_historial(desde=None, hasta=None, hoy=None):
+    """
+    Consulta de /api/historial. Con 'desde' devuelve ese rango tal cual.
+    Sin 'desde' devuelve los VENTANA_DIAS días que terminan en la entrada más
+    reciente (hasta 'hasta' u hoy): la consulta queda acotada, pero nunca vacía
+    mientras exista historial anterior.
+    """
+    if desde:
+        return leer_historial(desde, hasta)
+    limite = hasta or hoy or datetime.date.today()
+    with _lock:
+        segmentos = _listar_segmentos()
+    for nombre, inicio, fin in reversed(segmentos):
+        if inicio > limite:
+            continue
+        ancla = min(fin, limite)
+        entries = leer_historial(ancla - datetime.timedelta(days=VENTANA_DIAS), limite)
+        if entries:
+            return entries
+        limite = inicio - datetime.timedelta(days=1)
+    return []
+
+
+def leer_historial(desde=None, hasta=None):
+    """
+    Devuelve las entradas entre 'desde' y 'hasta' (date, inclusivas; None = abierto).
+    Solo se abren los segmentos cuyo rango se solapa con el pedido.
+    """
+    entries = []
+    with _lock:
+        for nombre, inicio, fin in _listar_segmentos():
+            if (desde and fin < desde) or (hasta and inicio > hasta):
+                continue
+            for entry in _leer_segmento(nombre):
+                fecha = _fecha_de(entry)
+                if (desde and fecha < desde) or (hasta and fecha > hasta):
+                    continue
+                entries.append(entry)
+    entries.sort(key=lambda e: str(e.get("fecha", "")))
+    return entries
+
+
+def compactar(hoy=None):
+    """
+    Aplica la retención y compacta los meses antiguos:
+      - borra los segmentos que terminan antes de hoy - RETENCION_DIAS
+        (solo si HISTORIAL_RETENCION_DIAS > 0; por defecto no se borra nada)
+      - fusiona los segmentos de cada mes que termina antes de hoy - COMPACTAR_TRAS_DIAS
+        en un único 'AAAA-MM.compacto.jsonl', sin 'details'
+    """
+    hoy = hoy or datetime.date.today()
+    limite_retencion = hoy - datetime.timedelta(days=RETENCION_DIAS) if RETENCION_DIAS > 0 else None
+    limite_compactar = hoy - datetime.timedelta(days=COMPACTAR_TRAS_DIAS)
+    borrados, compactados = 0, 0
+
+    with _lock:
+        # Temporales de una escritura atómica interrumpida
+        for nombre in os.listdir(SEGMENTOS_DIR):
+            if nombre.endswith(".tmp"):
+                os.remove(os.path.join(SEGMENTOS_DIR, nombre))
+
+        por_mes = {}
+        for nombre, inicio, fin in _listar_segmentos():
+            if limite_retencion and fin < limite_retencion:
+                os.remove(os.path.join(SEGMENTOS_DIR, nombre))
+                borrados += 1
+                continue
+            por_mes.setdefault(inicio.strftime("%Y-%m"), []).append((nombre, fin))
+        # Restos de una compactación interrumpida
+        for nombre in os.listdir(SEGMENTOS_DIR):
+            if nombre.endswith(FUSIONANDO):
+                rango = _rango_segmento(nombre)
+                if rango:
+                    por_mes.setdefault(rango[0].strftime("%Y-%m"), []).append((nombre, rango[1]))
+
+        for mes, segmentos in por_mes.items():
+            if max(fin for _, fin in segmentos) >= limite_compactar:
+                continue
+            compactados += _compactar_mes(mes, [n for n, _ in segmentos])
+
+    return {"borrados": borrados, "compactados": compactados}
+
+
+def _compactar_mes(mes, nombres):
+    """
+    Fusiona los segmentos de un mes en su compacto. Protocolo ante cortes:
+      1. cada segmento se renombra a '<nombre>.<token>.fusionando' (ya no recibe
+         appends; el token evita reutilizar un nombre de una cabecera anterior)
+      2. se escribe el compacto de forma atómica, con una cabecera que lista
+         los '.fusionando' que incluye
+      3. se borran los '.fusionando'
+    Si el proceso muere entre 2 y 3, los restos listados en la cabecera ya están
+    dentro del compacto y solo se borran; los no listados se fusionan de nuevo.
+    """
+    destino = mes + SUFIJO_COMPACTO
+    fusionados, entries = [], []
+    if destino in nombres:
+        fusionados, entries = _leer_con_cabecera(destino)
+
+    apartados = []
+    for nombre in nombres:
+        if nombre == destino:
+            continue
+        if nombre.endswith(FUSIONANDO):
+            if nombre in fusionados:
+                os.remove(os.path.join(SEGMENTOS_DIR, nombre))
+                continue
+            apartado = nombre
+        else:
+            apartado = f"{nombre}.{uuid.uuid4().hex[:8]}{FUSIONANDO}"
+            os.replace(os.path.join(SEGMENTOS_DIR, nombre), os.path.join(SEGMENTOS_DIR, apartado))
+        apartados.append(apartado)
+    if not apartados:
+        return 0
+
+    for apartado in apartados:
+        entries.extend(_leer_segmento(apartado))
+    entries = [_compactar_entry(e) for e in entries]
+    entries.sort(key=lambda e: str(e.get("fecha", "")))
+    _escribir_segmento(destino, entries, fusionados=apartados)
+    for apartado in apartados:
+        os.remove(os.path.join(SEGMENTOS_DIR, apartado))
+    return len(apartados)
+
+
+def iniciar_compactacion_periodica(intervalo=COMPACTAR_CADA_S):
+    """Lanza un hilo daemon que ejecuta compactar() cada 'intervalo' segundos."""
+    def _bucle():
+        while True:
+            try:
+                resultado = compactar()
+                if resultado["borrados"] or resultado["compactados"]:
+                    print(f"🗜️ Historial compactado: {resultado}")
+            except Exception as e:
+                print("❌ Error compactando historial:", e)
+            parar.wait(intervalo)
+            if parar.is_set():
+                return
+
+    parar = threading.Event()
+    threading.Thread(target=_bucle, name="historial-compactacion", daemon=True).start()
+    return parar
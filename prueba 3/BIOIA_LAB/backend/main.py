@@ -1,12 +1,31 @@
 # backend/main.py
 from fastapi import FastAPI, HTTPException
+from typing import Optional
+from contextlib import asynccontextmanager
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-import json, os, datetime
+import datetime
 from bio_nano_terminal import calcular_totales, WASTE_PROFILES, BIOAI_LEVELS
 from utils_visual import generar_estadisticas_visuales
+from historial_store import (
+    inicializar as inicializar_historial,
+    guardar_historial,
+    consultar_historial,
+    rango_consulta,
+    iniciar_compactacion_periodica,
+)
+
+# Historial particionado en data/historial/ (ver historial_store.py)
+inicializar_historial()
 
-app = FastAPI(title="BioNano Reclaimer API")
+@asynccontextmanager
+async def lifespan(app):
+    """Compactación del historial en segundo plano mientras la app está activa"""
+    parar = iniciar_compactacion_periodica()
+    yield
+    parar.set()
+
+app = FastAPI(title="BioNano Reclaimer API", lifespan=lifespan)
 
 # Configurar CORS
 app.add_middleware(
@@ -17,10 +36,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Ruta para el archivo de datos
-DATA_PATH = os.path.join(os.path.dirname(__file__), "data", "historial.json")
-os.makedirs(os.path.dirname(DATA_PATH), exist_ok=True)
-
 def adaptar_a_frontend(summary):
     """Adapta los datos del backend para el frontend"""
     energia_kwh = float(summary.get("total_energy_kwh", 0.0))
@@ -38,20 +53,10 @@ def adaptar_a_frontend(summary):
         "nanobots": {"activos": nanobots_activos}
     }
 
-def guardar_historial(entry):
-    """Guarda en el historial JSON"""
-    try:
-        with open(DATA_PATH, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    except Exception:
-        data = []
-    
-    data.append(entry)
-    with open(DATA_PATH, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-
+# Handlers con def (no async): FastAPI los ejecuta en su threadpool, así esperar
+# el lock del historial durante una compactación no bloquea el event loop
 @app.post("/api/calcular")
-async def calcular_simulacion(data: dict):
+def calcular_simulacion(data: dict):
     try:
         crew = int(data.get("crew", 1))
         days = int(data.get("days", 1))
@@ -96,11 +101,14 @@ async def calcular_simulacion(data: dict):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/historial")
-async def obtener_historial():
+def obtener_historial(desde: Optional[str] = None, hasta: Optional[str] = None):
+    """Historial filtrado por rango de fechas (AAAA-MM-DD, inclusivo; por defecto los días más recientes)"""
+    try:
+        desde_d, hasta_d = rango_consulta(desde, hasta)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Fechas en formato AAAA-MM-DD")
     try:
-        with open(DATA_PATH, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        return data
+        return consultar_historial(desde_d, hasta_d)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -0,0 +1,185 @@
+# backend/test_historial_store.py
+# Requiere pytest (solo para desarrollo; no está en requirements.txt).
+# Ejecutar desde backend/: python -m pytest -q
+import datetime, importlib, json, os
+import pytest
+import historial_store as h
+
+HOY = datetime.date(2026, 10, 19)
+
+
+def _entry(fecha, **extra):
+    return {"fecha": fecha, "tripulantes": 1, "resultados": {"energia": {"total_kw": 1.0}, **extra}}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """Apunta el historial a un directorio temporal con la configuración por defecto."""
+    monkeypatch.setattr(h, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(h, "SEGMENTOS_DIR", str(tmp_path / "historial"))
+    monkeypatch.setattr(h, "LEGACY_PATH", str(tmp_path / "historial.json"))
+    monkeypatch.setattr(h, "PARTICION", "dia")
+    monkeypatch.setattr(h, "RETENCION_DIAS", 0)
+    monkeypatch.setattr(h, "COMPACTAR_TRAS_DIAS", 7)
+    os.makedirs(h.SEGMENTOS_DIR)
+    return tmp_path
+
+
+def _segmentos():
+    return sorted(os.listdir(h.SEGMENTOS_DIR))
+
+
+def test_migracion_y_compactacion_conservan_datos_por_defecto(store):
+    # Incluye simulaciones idénticas repetidas: no deben fusionarse entre sí
+    legacy = [_entry("2025-10-05 08:22:%02d" % (i // 2), details={"x": i // 2}) for i in range(16)]
+    (store / "historial.json").write_text(json.dumps(legacy), encoding="utf-8")
+
+    h.inicializar()
+    assert _segmentos() == ["2025-10-05.legado.jsonl"]
+    assert (store / "historial.json.migrado").exists()
+
+    h.compactar(HOY)
+    entries = h.leer_historial(datetime.date(2025, 1, 1))
+    assert len(entries) == 16
+    assert all("details" not in e["resultados"] for e in entries)
+
+
+def test_consulta_solo_abre_segmentos_del_rango(store, monkeypatch):
+    for fecha in ("2026-10-01 10:00:00", "2026-10-10 10:00:00", "2026-10-18 10:00:00"):
+        h.guardar_historial(_entry(fecha))
+
+    abiertos = []
+    leer = h._leer_segmento
+    monkeypatch.setattr(h, "_leer_segmento", lambda nombre: abiertos.append(nombre) or leer(nombre))
+
+    entries = h.leer_historial(datetime.date(2026, 10, 5), datetime.date(2026, 10, 15))
+    assert [e["fecha"] for e in entries] == ["2026-10-10 10:00:00"]
+    assert abiertos == ["2026-10-10.jsonl"]
+
+
+def test_rango_consulta_valida_fechas():
+    assert h.rango_consulta() == (None, None)
+    assert h.rango_consulta("2026-10-01", "2026-10-19") == (datetime.date(2026, 10, 1), HOY)
+    with pytest.raises(ValueError):
+        h.rango_consulta("2026-13-01")
+
+
+def test_consulta_por_defecto_acotada_a_la_ventana(store, monkeypatch):
+    monkeypatch.setattr(h, "VENTANA_DIAS", 30)
+    for fecha in ("2026-08-01 10:00:00", "2026-10-01 10:00:00", "2026-10-18 10:00:00"):
+        h.guardar_historial(_entry(fecha))
+    assert [e["fecha"] for e in h.consultar_historial(hoy=HOY)] == [
+        "2026-10-01 10:00:00", "2026-10-18 10:00:00",
+    ]
+
+
+def test_consulta_por_defecto_usa_el_historial_mas_reciente(store, monkeypatch):
+    # Datos antiguos (p. ej. el historial migrado): la consulta sin 'desde' no queda vacía
+    monkeypatch.setattr(h, "VENTANA_DIAS", 30)
+    legacy = [_entry("2025-10-05 08:22:%02d" % i) for i in range(16)]
+    (store / "historial.json").write_text(json.dumps(legacy), encoding="utf-8")
+    h.inicializar()
+    h.guardar_historial(_entry("2025-06-01 10:00:00"))
+    (store / "historial" / "2026-10-01.jsonl").write_text("[1]\n", encoding="utf-8")
+
+    entries = h.consultar_historial(hoy=HOY)
+    assert len(entries) == 16
+    assert all(e["fecha"].startswith("2025-10-05") for e in entries)
+
+
+def test_compactacion_quita_details_y_borra_origen(store):
+    h.guardar_historial(_entry("2026-09-01 10:00:00", details={"a": 1}))
+    h.guardar_historial(_entry("2026-09-02 10:00:00", details={"a": 2}))
+    h.guardar_historial(_entry("2026-10-18 10:00:00", details={"a": 3}))
+
+    assert h.compactar(HOY) == {"borrados": 0, "compactados": 2}
+    assert _segmentos() == ["2026-09.compacto.jsonl", "2026-10-18.jsonl"]
+    septiembre = h.leer_historial(hasta=datetime.date(2026, 9, 30))
+    assert len(septiembre) == 2
+    assert all("details" not in e["resultados"] for e in septiembre)
+    # El mes en curso no se compacta todavía
+    assert "details" in h.leer_historial(datetime.date(2026, 10, 1))[0]["resultados"]
+
+
+def test_migracion_interrumpida_no_duplica(store):
+    legacy = [_entry("2025-10-05 08:22:00")] * 3
+    (store / "historial.json").write_text(json.dumps(legacy), encoding="utf-8")
+    h.inicializar()
+    # Simula un corte antes de renombrar historial.json: se migra otra vez
+    os.replace(store / "historial.json.migrado", store / "historial.json")
+    h.inicializar()
+    assert len(h.leer_historial(datetime.date(2025, 1, 1))) == 3
+
+
+class _Corte(Exception):
+    pass
+
+
+@pytest.mark.parametrize("escribe", [False, True])
+def test_compactacion_interrumpida_no_pierde_ni_duplica(store, monkeypatch, escribe):
+    h.guardar_historial(_entry("2026-09-01 10:00:00"))
+    h.guardar_historial(_entry("2026-09-01 10:00:00"))
+    h.compactar(HOY)
+    h.guardar_historial(_entry("2026-09-02 10:00:00"))
+
+    escribir = h._escribir_segmento
+
+    def _escribir_y_cortar(*args, **kwargs):
+        if escribe:
+            escribir(*args, **kwargs)  # corte tras escribir el compacto
+        raise _Corte()
+
+    monkeypatch.setattr(h, "_escribir_segmento", _escribir_y_cortar)
+    with pytest.raises(_Corte):
+        h.compactar(HOY)
+    monkeypatch.setattr(h, "_escribir_segmento", escribir)
+
+    h.compactar(HOY)
+    assert _segmentos() == ["2026-09.compacto.jsonl"]
+    assert [e["fecha"] for e in h.leer_historial(datetime.date(2026, 1, 1))] == [
+        "2026-09-01 10:00:00", "2026-09-01 10:00:00", "2026-09-02 10:00:00",
+    ]
+
+
+def test_retencion_explicita_borra_segmentos_antiguos(store, monkeypatch):
+    monkeypatch.setattr(h, "RETENCION_DIAS", 30)
+    h.guardar_historial(_entry("2026-08-01 10:00:00"))
+    h.guardar_historial(_entry("2026-10-18 10:00:00"))
+    assert h.compactar(HOY)["borrados"] == 1
+    assert [e["fecha"] for e in h.leer_historial()] == ["2026-10-18 10:00:00"]
+
+
+def test_fecha_invalida_va_a_fecha_fija(store):
+    h.guardar_historial({"fecha": "???", "resultados": {}})
+    assert _segmentos() == ["1970-01-01.jsonl"]
+
+
+def test_nombres_de_segmento_invalidos_se_ignoran(store):
+    h.guardar_historial(_entry("2026-10-18 10:00:00"))
+    for nombre in ("2025-13.jsonl", "2025-02-30.jsonl", "basura.jsonl", "notas.txt"):
+        (store / "historial" / nombre).write_text("{}\n", encoding="utf-8")
+    assert len(h.leer_historial()) == 1
+    assert h.compactar(HOY) == {"borrados": 0, "compactados": 0}
+
+
+def test_lineas_que_no_son_entradas_se_ignoran(store):
+    (store / "historial" / "2026-10-18.jsonl").write_text(
+        '[1]\n"texto"\n{"fecha": "2026-10-18 10:00:00"}\n{truncad', encoding="utf-8")
+    assert len(h.leer_historial()) == 1
+    (store / "historial.json").write_text('[1, {"fecha": "2025-10-05 08:00:00"}]', encoding="utf-8")
+    h.inicializar()
+    assert len(h.leer_historial(datetime.date(2025, 1, 1))) == 2
+
+
+def test_compactacion_borra_temporales(store):
+    (store / "historial" / "2026-09.compacto.jsonl.tmp").write_text("{", encoding="utf-8")
+    h.compactar(HOY)
+    assert _segmentos() == []
+
+
+def test_particion_invalida_falla_al_importar(monkeypatch):
+    monkeypatch.setenv("HISTORIAL_PARTICION", "day")
+    with pytest.raises(ValueError):
+        importlib.reload(h)
+    monkeypatch.delenv("HISTORIAL_PARTICION")
+    importlib.reload(h)